@@ -2,15 +2,143 @@ import requests
 import os
 from dotenv import load_dotenv
 import logging
-from datetime import datetime, timedelta
+import time
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 import pandas as pd
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from tracing import traced
 
 # Load environment variables
 load_dotenv()
 
-class APIHandler:
+class _CoalescedBatch:
+    """Ranges requested for one ticker during a coalescing window."""
+
     def __init__(self):
+        self.ranges: List[Tuple[date, date]] = []
+        self.ready = threading.Event()
+        # Sólo se espera la ventana si otro pedido del ticker ya estaba en curso
+        self.wait = False
+        self.intervals: List[Tuple[date, date, Future]] = []
+
+
+class _RequestCoalescer:
+    """Single-flight layer merging concurrent requests for the same ticker."""
+
+    def __init__(self, fetch, window: float = 0.02, max_gap_days: int = 1):
+        self.fetch = fetch
+        self.window = window
+        self.max_gap = timedelta(days=max_gap_days)
+        self._lock = threading.Lock()
+        self._batches: Dict[str, _CoalescedBatch] = {}
+        self._inflight: Dict[str, List[Tuple[date, date, Future]]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-fetch")
+
+    def get(self, ticker: str, start: date, end: date) -> Optional[pd.DataFrame]:
+        with self._lock:
+            pieces = self._cover(ticker, start, end)
+            missing = [(s, e) for s, e, interval in pieces if interval is None]
+            if missing:
+                batch = self._batches.get(ticker)
+                leader = batch is None
+                if leader:
+                    batch = self._batches[ticker] = _CoalescedBatch()
+                    batch.wait = ticker in self._inflight
+                batch.ranges.extend(missing)
+
+        if missing:
+            if leader:
+                self._run_batch(ticker, batch, missing[0])
+            else:
+                batch.ready.wait()
+            # Las partes que no estaban en curso se resuelven con los intervalos del lote
+            pieces = [
+                (s, e, interval or next(i for i in batch.intervals if i[0] <= s and e <= i[1]))
+                for s, e, interval in pieces
+            ]
+
+        frames = [self._slice(interval[2].result(), s, e) for s, e, interval in pieces]
+        frames = [frame for frame in frames if frame is not None]
+        if not frames:
+            return None
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    def _cover(self, ticker: str, start: date, end: date) -> List[Tuple[date, date, Optional[Tuple]]]:
+        """Split [start, end] into consecutive pieces served by in-flight intervals or missing (None)."""
+        inflight = self._inflight.get(ticker, [])
+        pieces = []
+        cursor = start
+        while cursor <= end:
+            covering = [i for i in inflight if i[0] <= cursor <= i[1]]
+            if covering:
+                interval = max(covering, key=lambda i: i[1])
+                piece_end = min(interval[1], end)
+            else:
+                # Hueco hasta el próximo intervalo en curso o el final del pedido
+                interval = None
+                later = [i[0] for i in inflight if i[0] > cursor]
+                piece_end = min([end] + [s - timedelta(days=1) for s in later])
+            pieces.append((cursor, piece_end, interval))
+            cursor = piece_end + timedelta(days=1)
+        return pieces
+
+    def _run_batch(self, ticker: str, batch: _CoalescedBatch, own_range: Tuple[date, date]):
+        # Esperar a juntar pedidos sólo si ya hay otro pedido en curso para el ticker
+        if batch.wait and self.window > 0:
+            time.sleep(self.window)
+
+        with self._lock:
+            del self._batches[ticker]
+            batch.intervals = [(s, e, Future()) for s, e in self._merge(batch.ranges)]
+            self._inflight.setdefault(ticker, []).extend(batch.intervals)
+        batch.ready.set()
+
+        # Los rangos disjuntos se piden en paralelo; el líder resuelve el suyo en su hilo
+        own = None
+        for interval in batch.intervals:
+            if interval[0] <= own_range[0] and own_range[1] <= interval[1] and own is None:
+                own = interval
+            else:
+                self._executor.submit(contextvars.copy_context().run, self._fetch_interval, ticker, interval)
+        self._fetch_interval(ticker, own)
+
+    def _fetch_interval(self, ticker: str, interval: Tuple[date, date, Future]):
+        start, end, future = interval
+        try:
+            future.set_result(self.fetch(ticker, start, end))
+        except Exception as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                remaining = [i for i in self._inflight[ticker] if i is not interval]
+                if remaining:
+                    self._inflight[ticker] = remaining
+                else:
+                    del self._inflight[ticker]
+
+    def _merge(self, ranges: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+        """Merge overlapping or adjacent ranges into the fewest wider ones."""
+        merged: List[List[date]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + self.max_gap:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [(start, end) for start, end in merged]
+
+    @staticmethod
+    def _slice(data: Optional[pd.DataFrame], start: date, end: date) -> Optional[pd.DataFrame]:
+        if data is None:
+            return None
+        sliced = data[(data['date'] >= start) & (data['date'] <= end)].reset_index(drop=True)
+        return sliced if not sliced.empty else None
+
+
+class APIHandler:
+    def __init__(self, coalesce_window: float = 0.02):
         self.api_key = os.getenv('API_KEY')
         self.base_url_his = os.getenv('BASE_URL_HIS')
         self.base_url_real = os.getenv('BASE_URL_REAL')
@@ -23,6 +151,7 @@ class APIHandler:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         })
+        self._coalescer = _RequestCoalescer(self._fetch_range, window=coalesce_window)
 
     def test_connection(self) -> bool:
         """Test the API connection."""
@@ -36,10 +165,15 @@ class APIHandler:
             logging.error(f"API connection test failed: {e}")
             return False
 
+    @traced("api.get_stock_data")
     def get_stock_data(self, ticker: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Optional[pd.DataFrame]:
         """
         Fetch stock data for a given ticker and date range.
         
+        Concurrent calls for the same ticker are coalesced: a range already in flight
+        is reused, only the missing part of an overlapping range is requested, and
+        each caller gets its own slice.
+        
         Args:
             ticker: Stock symbol
             start_date: Start date in YYYY/MM/DD format (optional)
@@ -49,46 +183,8 @@ class APIHandler:
             DataFrame with stock data or None if request fails
         """
         try:
-            # Set default dates if not provided
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
-            if not start_date:
-                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-
-            # Convert date format from YYYY/MM/DD to YYYY-MM-DD
-            start_date = start_date.replace('/', '-')
-            end_date = end_date.replace('/', '-')
-
-            # Ensure dates are within valid range
-            end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
-            if end_datetime > datetime.now():
-                end_date = datetime.now().strftime('%Y-%m-%d')
-
-            url = f"{self.base_url_his}/{ticker}/range/1/day/{start_date}/{end_date}"
-            params = {"apiKey": self.api_key}
-            
-            logging.info(f"Requesting data for {ticker} from {start_date} to {end_date}")
-            response = self.session.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if 'results' not in data:
-                logging.warning(f"No data available for {ticker}")
-                return None
-                
-            # Convert to DataFrame
-            df = pd.DataFrame(data['results'])
-            df['date'] = pd.to_datetime(df['t'], unit='ms').dt.date
-            df = df.rename(columns={
-                'o': 'open',
-                'h': 'high',
-                'l': 'low',
-                'c': 'close',
-                'v': 'volume'
-            })
-            
-            return df[['date', 'open', 'high', 'low', 'close', 'volume']]
+            start, end = self._normalize_range(start_date, end_date)
+            return self._coalescer.get(ticker, start, end)
             
         except requests.exceptions.RequestException as e:
             logging.error(f"API request failed for {ticker}: {e}")
@@ -97,6 +193,91 @@ class APIHandler:
             logging.error(f"Error processing data for {ticker}: {e}")
             raise Exception(f"Error processing data: {str(e)}")
 
+    @staticmethod
+    def _normalize_range(start_date: Optional[str], end_date: Optional[str]) -> Tuple[date, date]:
+        """Apply default dates, accept YYYY/MM/DD or YYYY-MM-DD and clamp the end to today."""
+        today = datetime.now().date()
+        
+        # Set default dates if not provided
+        if not end_date:
+            end = today
+        else:
+            end = datetime.strptime(end_date.replace('/', '-'), '%Y-%m-%d').date()
+        if not start_date:
+            start = today - timedelta(days=30)
+        else:
+            start = datetime.strptime(start_date.replace('/', '-'), '%Y-%m-%d').date()
+
+        # Ensure dates are within valid range
+        return start, min(end, today)
+
+    @traced("api.fetch_range")
+    def _fetch_range(self, ticker: str, start: date, end: date) -> Optional[pd.DataFrame]:
+        """Perform the HTTP request for a single ticker and date range."""
+        url = f"{self.base_url_his}/{ticker}/range/1/day/{start.isoformat()}/{end.isoformat()}"
+        # Barras sin ajustar: los splits y dividendos se aplican al leer desde la base
+        params = {"apiKey": self.api_key, "adjusted": "false"}
+        
+        logging.info(f"Requesting data for {ticker} from {start} to {end}")
+        response = self.session.get(url, params=params)
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        if 'results' not in data:
+            logging.warning(f"No data available for {ticker}")
+            return None
+            
+        # Convert to DataFrame
+        df = pd.DataFrame(data['results'])
+        df['date'] = pd.to_datetime(df['t'], unit='ms').dt.date
+        df = df.rename(columns={
+            'o': 'open',
+            'h': 'high',
+            'l': 'low',
+            'c': 'close',
+            'v': 'volume'
+        })
+        
+        return df[['date', 'open', 'high', 'low', 'close', 'volume']]
+
+    def get_corporate_actions(self, ticker: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the splits and cash dividends of a ticker.
+        
+        Args:
+            ticker: Stock symbol
+            
+        Returns:
+            Dictionary with 'splits' (ex_date, split_from, split_to) and
+            'dividends' (ex_date, cash_amount) lists
+        """
+        try:
+            # BASE_URL_REAL apunta a /v3/reference/tickers; splits y dividendos son hermanos
+            base_url_ref = self.base_url_real.rstrip('/').rsplit('/', 1)[0]
+            params = {"apiKey": self.api_key, "ticker": ticker, "limit": 1000}
+            
+            response = self.session.get(f"{base_url_ref}/splits", params=params)
+            response.raise_for_status()
+            splits = [
+                {'ex_date': s['execution_date'], 'split_from': s['split_from'], 'split_to': s['split_to']}
+                for s in response.json().get('results', [])
+            ]
+            
+            response = self.session.get(f"{base_url_ref}/dividends", params=params)
+            response.raise_for_status()
+            dividends = [
+                {'ex_date': d['ex_dividend_date'], 'cash_amount': d['cash_amount']}
+                for d in response.json().get('results', [])
+                if d.get('ex_dividend_date') and d.get('cash_amount')
+            ]
+            
+            return {'splits': splits, 'dividends': dividends}
+            
+        except Exception as e:
+            logging.error(f"Failed to get corporate actions for {ticker}: {e}")
+            raise Exception(f"Failed to get corporate actions: {str(e)}")
+
     def get_realtime_quote(self, ticker: str) -> Dict[str, Any]:
         """
         Get real-time quote for a ticker.
@@ -0,0 +1,212 @@
+import logging
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from db_handler import StockDatabase
+from technical_analysis import TechnicalAnalysis
+from tracing import tracer
+
+# Parámetros por defecto de las reglas de entrada/salida
+DEFAULT_PARAMS: Dict[str, Any] = {
+    'rsi_period': 14,
+    'rsi_entry': 30,
+    'rsi_exit': 70,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'bb_period': 20,
+    'bb_std': 2,
+    'entry_rules': ('rsi', 'bollinger'),
+    'exit_rules': ('rsi', 'bollinger', 'macd'),
+    'fee': 0.0,
+}
+
+TRADING_DAYS = 252
+
+
+def expand_grid(param_grid: Dict[str, Iterable]) -> List[Dict[str, Any]]:
+    """Expand a parameter grid into a list of parameter combinations."""
+    keys = list(param_grid.keys())
+    values = [list(v) for v in param_grid.values()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+class _IndicatorCache:
+    """Memoize indicator series so a sweep computes each variant only once per ticker."""
+
+    def __init__(self, close: pd.Series):
+        self.close = close
+        self._cache: Dict[Tuple, Any] = {}
+
+    def get(self, key: Tuple, compute: Callable[[], Any]):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def rsi(self, period: int) -> np.ndarray:
+        return self.get(('rsi', period),
+                        lambda: TechnicalAnalysis.calculate_rsi(self.close, period).to_numpy())
+
+    def macd(self, fast: int, slow: int, signal: int) -> np.ndarray:
+        return self.get(('macd', fast, slow, signal),
+                        lambda: TechnicalAnalysis.calculate_macd(self.close, fast, slow, signal)['histogram'].to_numpy())
+
+    def bollinger(self, period: int, num_std: float) -> Tuple[np.ndarray, np.ndarray]:
+        def compute():
+            bands = TechnicalAnalysis.calculate_bollinger_bands(self.close, period, num_std)
+            return bands['lower'].to_numpy(), bands['upper'].to_numpy()
+        return self.get(('bb', period, num_std), compute)
+
+
+class Backtester:
+    """Vectorized long-only backtests over the bars stored in StockDatabase."""
+
+    def __init__(self, db_handler: StockDatabase):
+        self.db_handler = db_handler
+
+    @staticmethod
+    def build_signals(close: np.ndarray, indicators: _IndicatorCache, params: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """Build boolean entry/exit arrays from RSI, MACD and Bollinger rules."""
+        rsi = indicators.rsi(params['rsi_period'])
+        hist = indicators.macd(params['macd_fast'], params['macd_slow'], params['macd_signal'])
+        lower, upper = indicators.bollinger(params['bb_period'], params['bb_std'])
+
+        # Cruces del histograma MACD por cero
+        prev_hist = np.roll(hist, 1)
+        prev_hist[0] = np.nan
+        macd_up = (prev_hist <= 0) & (hist > 0)
+        macd_down = (prev_hist >= 0) & (hist < 0)
+
+        entry_signals = {
+            'rsi': rsi < params['rsi_entry'],
+            'macd': macd_up,
+            'bollinger': close < lower,
+        }
+        exit_signals = {
+            'rsi': rsi > params['rsi_exit'],
+            'macd': macd_down,
+            'bollinger': close > upper,
+        }
+
+        entry = np.zeros(len(close), dtype=bool)
+        exit_ = np.zeros(len(close), dtype=bool)
+        for rule in params['entry_rules']:
+            entry |= entry_signals[rule]
+        for rule in params['exit_rules']:
+            exit_ |= exit_signals[rule]
+        return entry, exit_
+
+    @staticmethod
+    def positions_from_signals(entry: np.ndarray, exit_: np.ndarray) -> np.ndarray:
+        """Turn entry/exit events into a 0/1 position filled at the close of the next bar."""
+        # Las salidas tienen prioridad si ambas señales coinciden en la misma barra
+        state = np.where(exit_, 0.0, np.where(entry, 1.0, np.nan))
+        state = pd.Series(state).ffill().fillna(0.0).to_numpy()
+        # Operar al cierre de la barra siguiente para evitar look-ahead: la señal de la
+        # barra i se ejecuta al cierre de i+1 y gana el retorno de i+1 a i+2
+        position = np.zeros_like(state)
+        position[2:] = state[:-2]
+        return position
+
+    @staticmethod
+    def evaluate(close: np.ndarray, position: np.ndarray, fee: float = 0.0) -> Dict[str, float]:
+        """Compute PnL, drawdown and turnover statistics for a position array."""
+        returns = np.zeros(len(close))
+        returns[1:] = close[1:] / close[:-1] - 1.0
+        trades = np.abs(np.diff(position, prepend=0.0))
+        strategy_returns = position * returns - trades * fee
+
+        equity = np.cumprod(1.0 + strategy_returns)
+        drawdown = equity / np.maximum.accumulate(equity) - 1.0
+        std = strategy_returns.std()
+
+        return {
+            'total_return': float(equity[-1] - 1.0) if len(equity) else 0.0,
+            'max_drawdown': float(drawdown.min()) if len(drawdown) else 0.0,
+            'sharpe': float(strategy_returns.mean() / std * np.sqrt(TRADING_DAYS)) if std > 0 else 0.0,
+            'turnover': float(trades.sum()),
+            'trades': int((np.diff(position, prepend=0.0) > 0).sum()),
+            'exposure': float(position.mean()) if len(position) else 0.0,
+        }
+
+    @staticmethod
+    def run_frame(data: pd.DataFrame, params: Optional[Dict[str, Any]] = None,
+                  indicators: Optional[_IndicatorCache] = None) -> Dict[str, float]:
+        """Backtest a single parameter set over a DataFrame of bars."""
+        params = {**DEFAULT_PARAMS, **(params or {})}
+        close_series = data['close'].astype(float).reset_index(drop=True)
+        indicators = indicators or _IndicatorCache(close_series)
+        close = close_series.to_numpy()
+
+        entry, exit_ = Backtester.build_signals(close, indicators, params)
+        position = Backtester.positions_from_signals(entry, exit_)
+        return Backtester.evaluate(close, position, params['fee'])
+
+    def run(self, ticker: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, float]]:
+        """Backtest a single parameter set for a stored ticker."""
+        data = self.db_handler.get_adjusted_stock_data(ticker)
+        if data is None:
+            logging.warning(f"No existen datos para el backtest de {ticker}")
+            return None
+        return self.run_frame(data, params)
+
+    def sweep(self, tickers: List[str], param_grid: Dict[str, Iterable],
+              max_workers: Optional[int] = None) -> pd.DataFrame:
+        """
+        Run every parameter combination over every ticker using a process pool.
+
+        Args:
+            tickers: Stock symbols stored in the database
+            param_grid: Mapping of parameter name to candidate values
+            max_workers: Number of worker processes (defaults to CPU count)
+
+        Returns:
+            DataFrame with one row per (ticker, parameter set)
+        """
+        combos = expand_grid(param_grid)
+        results = []
+
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(self.db_handler.db_file,)) as executor:
+            futures = {
+                executor.submit(_sweep_ticker, ticker, combos): ticker
+                for ticker in tickers
+            }
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    logging.error(f"Error en el backtest de {ticker}: {e}")
+
+        return pd.DataFrame(results)
+
+
+# Base de datos abierta una sola vez por proceso del pool
+_worker_db: Optional[StockDatabase] = None
+
+
+def _init_worker(db_file: str):
+    global _worker_db
+    _worker_db = StockDatabase(db_file)
+
+
+def _sweep_ticker(ticker: str, combos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Worker: load a ticker once and evaluate all parameter combinations."""
+    try:
+        data = _worker_db.get_adjusted_stock_data(ticker)
+        if data is None:
+            return []
+
+        close = data['close'].astype(float).reset_index(drop=True)
+        indicators = _IndicatorCache(close)
+        rows = []
+        for combo in combos:
+            stats = Backtester.run_frame(data, combo, indicators)
+            rows.append({'ticker': ticker, **combo, **stats})
+        return rows
+    finally:
+        # Los procesos del pool terminan sin ejecutar atexit: guardar sus spans en cada tarea
+        tracer.flush()
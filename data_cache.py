@@ -0,0 +1,109 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+import pandas as pd
+from db_handler import StockDatabase
+
+class StockDataCache:
+    """In-process LRU cache of ticker frames, kept in sync with StockDatabase."""
+
+    def __init__(self, db_handler: StockDatabase, max_entries: int = 32, prefetch_neighbours: int = 1):
+        self.db_handler = db_handler
+        self.max_entries = max_entries
+        self.prefetch_neighbours = prefetch_neighbours
+
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._stored_stocks: Optional[List[Tuple[str, str, str]]] = None
+        # Contador de escrituras para descartar lecturas que compitan con una invalidación
+        self._epoch = 0
+        self._pending: set = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+        self.db_handler.add_change_listener(self.invalidate)
+
+    def invalidate(self, ticker: Optional[str] = None):
+        """Drop cached data for a ticker (or everything) after a write or delete."""
+        with self._lock:
+            self._stored_stocks = None
+            self._epoch += 1
+            if ticker is None:
+                self._entries.clear()
+                return
+            self._entries.pop(ticker.upper(), None)
+
+    def get_stored_stocks(self) -> List[Tuple[str, str, str]]:
+        """Get the stored ticker list, reading the database only after invalidation."""
+        with self._lock:
+            if self._stored_stocks is not None:
+                return self._stored_stocks
+            epoch = self._epoch
+        stored = self.db_handler.get_stored_stocks()
+        with self._lock:
+            if self._epoch == epoch:
+                self._stored_stocks = stored
+        return stored
+
+    def get_data(self, ticker: str) -> Optional[pd.DataFrame]:
+        """Get the bars for a ticker. The returned frame is shared and must not be modified."""
+        return self._load(ticker.upper())
+
+    def _load(self, ticker: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            data = self._entries.get(ticker)
+            if data is not None:
+                self._entries.move_to_end(ticker)
+                return data
+            epoch = self._epoch
+
+        data = self.db_handler.get_adjusted_stock_data(ticker)
+        if data is None or data.empty:
+            return None
+
+        with self._lock:
+            # Si hubo una escritura mientras se leía, no guardar el resultado viejo
+            if self._epoch == epoch:
+                self._entries[ticker] = data
+                self._entries.move_to_end(ticker)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return data
+
+    def prefetch(self, tickers: Iterable[str]):
+        """Warm the cache for the given tickers in the background."""
+        for ticker in tickers:
+            ticker = ticker.upper()
+            with self._lock:
+                if ticker in self._entries or ticker in self._pending:
+                    continue
+                self._pending.add(ticker)
+            self._executor.submit(self._prefetch_one, ticker)
+
+    def prefetch_around(self, ticker: str):
+        """Prefetch the neighbours of a ticker in the stored list."""
+        ticker = ticker.upper()
+        tickers = [stock[0] for stock in self.get_stored_stocks()]
+        candidates = []
+        if ticker in tickers:
+            index = tickers.index(ticker)
+            for offset in range(1, self.prefetch_neighbours + 1):
+                if index + offset < len(tickers):
+                    candidates.append(tickers[index + offset])
+                if index - offset >= 0:
+                    candidates.append(tickers[index - offset])
+        self.prefetch(candidates)
+
+    def _prefetch_one(self, ticker: str):
+        try:
+            self._load(ticker)
+        except Exception as e:
+            logging.warning(f"Error al precargar {ticker}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(ticker)
+
+    def close(self):
+        """Stop the background prefetch workers."""
+        self._executor.shutdown(wait=False)
@@ -1,14 +1,42 @@
+import os
+import glob
 import sqlite3
 import logging
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
+from db_maintenance import apply_migrations
+from tracing import traced
 
 class StockDatabase:
-    def __init__(self, db_file: str = 'stocks.db'):
+    def __init__(self, db_file: str = 'stocks.db', adjusted_cache_size: int = 64):
         self.db_file = db_file
+        self._change_listeners: List[Callable[[str], None]] = []
+        # Series ajustadas por ticker, descartadas ante cualquier escritura del ticker
+        self._adjusted_cache: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._adjusted_cache_size = adjusted_cache_size
+        self._adjusted_lock = threading.Lock()
+        self._adjusted_epoch = 0
         self.setup_database()
 
+    def add_change_listener(self, callback: Callable[[str], None]):
+        """Register a callback invoked with the ticker after its data is written or deleted."""
+        self._change_listeners.append(callback)
+
+    def notify_change(self, ticker: str):
+        """Invoke the change listeners for a ticker."""
+        with self._adjusted_lock:
+            self._adjusted_cache.pop(ticker, None)
+            self._adjusted_epoch += 1
+        for callback in self._change_listeners:
+            try:
+                callback(ticker)
+            except Exception as e:
+                logging.error(f"Error al notificar cambios de {ticker}: {e}")
+
     @contextmanager
     def get_connection(self):
         """Context manager for database connections."""
@@ -24,7 +52,7 @@ class StockDatabase:
                 conn.close()
 
     def setup_database(self):
-        """Create necessary tables if they don't exist."""
+        """Create necessary tables if they don't exist and apply pending migrations."""
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
@@ -53,7 +81,9 @@ class StockDatabase:
                 ''')
                 
                 conn.commit()
-                logging.info("Base de datos inicializada correctamente")
+
+                version = apply_migrations(conn)
+                logging.info(f"Base de datos inicializada correctamente (versión {version})")
                 
         except Exception as e:
             logging.error(f"Error al configurar la base de datos: {e}")
@@ -61,40 +91,351 @@ class StockDatabase:
 
     def save_stock_data(self, ticker: str, data: pd.DataFrame):
         """Save stock data and update date ranges."""
+        data_to_save = data.copy()
+        data_to_save['ticker'] = ticker
+        self.bulk_insert(data_to_save, skip_existing=False)
+        logging.info(f"Datos guardados para {ticker}")
+
+    @traced("db.bulk_insert")
+    def bulk_insert(self, data: pd.DataFrame, skip_existing: bool = True) -> int:
+        """
+        Write bars for one or more tickers in a single transaction.
+        
+        Args:
+            data: DataFrame with ticker, date, open, high, low, close and volume columns,
+                and optionally an adjusted flag (raw bars are assumed when missing) and
+                the adjusted_as_of date of adjusted bars
+            skip_existing: Keep rows already stored instead of replacing them
+            
+        Returns:
+            Number of rows written
+        """
+        if data.empty:
+            return 0
+
+        if pd.api.types.is_string_dtype(data['date']):
+            dates = data['date']
+        else:
+            dates = pd.to_datetime(data['date']).dt.strftime('%Y-%m-%d')
+
+        # Preparar datos para stock_data
+        rows = zip(
+            data['ticker'].tolist(),
+            dates.tolist(),
+            data['open'].astype(float).tolist(),
+            data['high'].astype(float).tolist(),
+            data['low'].astype(float).tolist(),
+            data['close'].astype(float).tolist(),
+            data['volume'].astype(float).tolist(),
+            data['adjusted'].astype(int).tolist() if 'adjusted' in data else [0] * len(data),
+            ([as_of if isinstance(as_of, str) and as_of else None for as_of in data['adjusted_as_of']]
+             if 'adjusted_as_of' in data else [None] * len(data))
+        )
+        tickers = data['ticker'].unique().tolist()
+        conflict = "IGNORE" if skip_existing else "REPLACE"
+
         try:
             with self.get_connection() as conn:
-                # Preparar datos para stock_data
-                data_to_save = data.copy()
-                data_to_save['ticker'] = ticker
+                # Guardar datos en stock_data sin tocar los demás tickers
+                cursor = conn.cursor()
+                before = conn.total_changes
+                cursor.executemany(f'''
+                    INSERT OR {conflict} INTO stock_data
+                        (ticker, date, open, high, low, close, volume, adjusted, adjusted_as_of)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                written = conn.total_changes - before
                 
-                # Guardar datos en stock_data
-                data_to_save.to_sql('stock_data', conn, if_exists='replace', index=False)
+                # Actualizar date_ranges sin achicar el rango de los años ya archivados
+                cursor.executemany('''
+                    INSERT INTO date_ranges (ticker, start_date, end_date)
+                    SELECT ticker, MIN(date), MAX(date) FROM stock_data WHERE ticker = ?
+                    ON CONFLICT (ticker) DO UPDATE SET
+                        start_date = MIN(start_date, excluded.start_date),
+                        end_date = MAX(end_date, excluded.end_date)
+                ''', [(ticker,) for ticker in tickers])
+                
+                conn.commit()
                 
-                # Actualizar date_ranges
+        except Exception as e:
+            logging.error(f"Error al guardar datos: {e}")
+            raise
+
+        for ticker in tickers:
+            self.notify_change(ticker)
+        return written
+
+    @traced("db.get_stock_data")
+    def get_stock_data(self, ticker: str, include_archive: bool = False) -> pd.DataFrame:
+        """Get stock data for a specific ticker, optionally including archived years."""
+        try:
+            query = "SELECT * FROM stock_data WHERE ticker = ? ORDER BY date"
+            frames = []
+            if include_archive:
+                for archive in self.archive_files():
+                    conn = sqlite3.connect(archive)
+                    try:
+                        frames.append(pd.read_sql_query(query, conn, params=(ticker,)))
+                    finally:
+                        conn.close()
+
+            with self.get_connection() as conn:
+                frames.append(pd.read_sql_query(query, conn, params=(ticker,)))
+
+            data = frames[0]
+            if len(frames) > 1:
+                # Un año guardado de nuevo tras archivarlo queda también en la base principal, que es la más reciente
+                data = (pd.concat(frames, ignore_index=True)
+                        .drop_duplicates('date', keep='last')
+                        .sort_values('date', ignore_index=True))
+            return data if not data.empty else None
+                
+        except Exception as e:
+            logging.error(f"Error al obtener datos de stock: {e}")
+            raise
+
+    def add_adjustment(self, ticker: str, ex_date: str, kind: str, price_factor: float, volume_factor: float = 1.0) -> bool:
+        """
+        Store one corporate-action factor; stored bars are left untouched.
+        
+        Args:
+            ticker: Stock symbol
+            ex_date: First date (YYYY-MM-DD) trading without the action's effect
+            kind: 'split' or 'dividend'
+            price_factor: Multiplier applied to prices of bars before ex_date
+            volume_factor: Multiplier applied to volumes of bars before ex_date
+            
+        Returns:
+            True if the factor was new
+        """
+        try:
+            with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                    INSERT OR REPLACE INTO date_ranges (ticker, start_date, end_date)
-                    VALUES (?, ?, ?)
-                ''', (
-                    ticker,
-                    data['date'].min(),
-                    data['date'].max()
-                ))
+                    INSERT OR IGNORE INTO adjustment_factors (ticker, ex_date, kind, price_factor, volume_factor)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (ticker, ex_date, kind, price_factor, volume_factor))
+                conn.commit()
+                added = cursor.rowcount > 0
+                
+        except Exception as e:
+            logging.error(f"Error al guardar el ajuste de {ticker}: {e}")
+            raise
+
+        if added:
+            logging.info(f"Ajuste {kind} agregado para {ticker} en {ex_date}")
+            self.notify_change(ticker)
+        return added
+
+    def save_corporate_actions(self, ticker: str, actions: Dict[str, List[Dict]]) -> int:
+        """
+        Convert splits and cash dividends into adjustment factors.
+        
+        Args:
+            ticker: Stock symbol
+            actions: Dict with 'splits' (ex_date, split_from, split_to) and
+                'dividends' (ex_date, cash_amount) lists
+            
+        Returns:
+            Number of new factors stored
+        """
+        added = 0
+        for split in actions.get('splits', []):
+            if not split.get('split_from') or not split.get('split_to'):
+                continue
+            ratio = split['split_from'] / split['split_to']
+            added += self.add_adjustment(ticker, split['ex_date'], 'split', ratio, 1 / ratio)
+
+        dividends = actions.get('dividends', [])
+        if dividends:
+            with self.get_connection() as conn:
+                for dividend in dividends:
+                    # El factor usa el último cierre sin ajustar anterior a la fecha ex-dividendo
+                    row = conn.execute('''
+                        SELECT date, close, adjusted, adjusted_as_of FROM stock_data
+                        WHERE ticker = ? AND date < ?
+                        ORDER BY date DESC LIMIT 1
+                    ''', (ticker, dividend['ex_date'])).fetchone()
+                    if row is None or not row[1]:
+                        continue
+                    close = row[1]
+                    if row[2]:
+                        # Deshacer los splits que la API ya había aplicado a la barra
+                        for (split_factor,) in conn.execute('''
+                            SELECT price_factor FROM adjustment_factors
+                            WHERE ticker = ? AND kind = 'split' AND ex_date > ? AND ex_date <= ?
+                        ''', (ticker, row[0], row[3] or '9999-12-31')):
+                            close /= split_factor
+                    if dividend['cash_amount'] >= close:
+                        continue
+                    factor = 1 - dividend['cash_amount'] / close
+                    added += self.add_adjustment(ticker, dividend['ex_date'], 'dividend', factor)
+        return added
+
+    def get_adjustment_factors(self, ticker: str) -> pd.DataFrame:
+        """Get the adjustment factors of a ticker ordered by ex-date."""
+        try:
+            with self.get_connection() as conn:
+                query = '''
+                    SELECT ex_date, kind, price_factor, volume_factor
+                    FROM adjustment_factors WHERE ticker = ? ORDER BY ex_date
+                '''
+                return pd.read_sql_query(query, conn, params=(ticker,))
                 
+        except Exception as e:
+            logging.error(f"Error al obtener ajustes de {ticker}: {e}")
+            raise
+
+    def get_adjustments(self, tickers: Optional[List[str]] = None) -> pd.DataFrame:
+        """Get the adjustment factors of several tickers (all if omitted)."""
+        query = "SELECT ticker, ex_date, kind, price_factor, volume_factor FROM adjustment_factors"
+        params: List[str] = []
+        if tickers:
+            query += f" WHERE ticker IN ({', '.join('?' * len(tickers))})"
+            params.extend(tickers)
+        try:
+            with self.get_connection() as conn:
+                return pd.read_sql_query(query + " ORDER BY ticker, ex_date", conn, params=params)
+                
+        except Exception as e:
+            logging.error(f"Error al obtener ajustes: {e}")
+            raise
+
+    def save_adjustments(self, data: pd.DataFrame) -> int:
+        """Store many adjustment factors in one transaction, keeping existing ones."""
+        if data.empty:
+            return 0
+        rows = zip(
+            data['ticker'].tolist(),
+            data['ex_date'].tolist(),
+            data['kind'].tolist(),
+            data['price_factor'].astype(float).tolist(),
+            data['volume_factor'].astype(float).tolist()
+        )
+        try:
+            with self.get_connection() as conn:
+                before = conn.total_changes
+                conn.executemany('''
+                    INSERT OR IGNORE INTO adjustment_factors (ticker, ex_date, kind, price_factor, volume_factor)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
                 conn.commit()
-                logging.info(f"Datos guardados para {ticker}")
+                written = conn.total_changes - before
                 
         except Exception as e:
-            logging.error(f"Error al guardar datos: {e}")
+            logging.error(f"Error al guardar ajustes: {e}")
             raise
 
-    def get_stock_data(self, ticker: str) -> pd.DataFrame:
-        """Get stock data for a specific ticker."""
+        for ticker in data['ticker'].unique().tolist():
+            self.notify_change(ticker)
+        return written
+
+    @staticmethod
+    def apply_adjustments(bars: pd.DataFrame, factors: pd.DataFrame) -> pd.DataFrame:
+        """
+        Apply cumulative split/dividend factors to the bars of a single ticker.
+        
+        Raw bars receive every factor with a later ex-date. Bars already adjusted by
+        the API only receive dividends and the splits after their adjusted_as_of date.
+        """
+        if factors.empty or bars.empty:
+            return bars
+
+        dates = bars['date'].to_numpy(dtype=str)
+        if 'adjusted' in bars:
+            already = bars['adjusted'].fillna(1).to_numpy() != 0
+        else:
+            already = np.zeros(len(bars), dtype=bool)
+        if 'adjusted_as_of' in bars:
+            # Sin fecha conocida se asume que la barra ya incluye todos los splits
+            as_of = bars['adjusted_as_of'].fillna('9999-12-31').to_numpy(dtype=str)
+        else:
+            as_of = np.full(len(bars), '9999-12-31')
+        split_dates = np.where(already & (as_of > dates), as_of, dates)
+
+        def cumulative(selected: pd.DataFrame, column: str, at: np.ndarray) -> np.ndarray:
+            # Producto acumulado desde el final: cada barra recibe los factores con ex_date posterior
+            if selected.empty:
+                return np.ones(len(at))
+            cum = np.append(np.cumprod(selected[column].to_numpy()[::-1])[::-1], 1.0)
+            return cum[np.searchsorted(selected['ex_date'].to_numpy(dtype=str), at, side='right')]
+
+        is_split = (factors['kind'] == 'split').to_numpy()
+        splits, dividends = factors[is_split], factors[~is_split]
+        price_mult = cumulative(splits, 'price_factor', split_dates) * cumulative(dividends, 'price_factor', dates)
+        volume_mult = cumulative(splits, 'volume_factor', split_dates) * cumulative(dividends, 'volume_factor', dates)
+
+        adjusted = bars.copy()
+        for column in ('open', 'high', 'low', 'close'):
+            adjusted[column] = bars[column].to_numpy() * price_mult
+        adjusted['volume'] = bars['volume'].to_numpy() * volume_mult
+        return adjusted
+
+    def get_adjusted_stock_data(self, ticker: str) -> Optional[pd.DataFrame]:
+        """
+        Get split- and dividend-adjusted bars for a ticker, including archived years.
+        
+        The result is computed on read from the raw bars and cached until the
+        ticker's bars or factors change; it is shared and must not be modified.
+        """
+        with self._adjusted_lock:
+            cached = self._adjusted_cache.get(ticker)
+            if cached is not None:
+                self._adjusted_cache.move_to_end(ticker)
+                return cached
+            epoch = self._adjusted_epoch
+
+        data = self.get_stock_data(ticker, include_archive=True)
+        if data is None:
+            return None
+        adjusted = self.apply_adjustments(data, self.get_adjustment_factors(ticker))
+
+        with self._adjusted_lock:
+            # No guardar el resultado si hubo una escritura durante la lectura
+            if self._adjusted_epoch != epoch:
+                return adjusted
+            self._adjusted_cache[ticker] = adjusted
+            while len(self._adjusted_cache) > self._adjusted_cache_size:
+                self._adjusted_cache.popitem(last=False)
+        return adjusted
+
+    def get_bars(self, tickers: Optional[List[str]] = None, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None, include_archive: bool = False) -> pd.DataFrame:
+        """Get the bars of several tickers within an optional date range, ordered by ticker and date."""
+        conditions, params = [], []
+        if tickers:
+            conditions.append(f"ticker IN ({', '.join('?' * len(tickers))})")
+            params.extend(tickers)
+        if start_date:
+            start_date = start_date.replace('/', '-')
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            end_date = end_date.replace('/', '-')
+            conditions.append("date <= ?")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"SELECT * FROM stock_data {where} ORDER BY ticker, date"
+
         try:
+            frames = []
+            if include_archive:
+                for archive in self.archive_files(start_date, end_date):
+                    conn = sqlite3.connect(archive)
+                    try:
+                        frames.append(pd.read_sql_query(query, conn, params=params))
+                    finally:
+                        conn.close()
+
             with self.get_connection() as conn:
-                query = "SELECT * FROM stock_data WHERE ticker = ? ORDER BY date"
-                data = pd.read_sql_query(query, conn, params=(ticker,))
-                return data if not data.empty else None
+                frames.append(pd.read_sql_query(query, conn, params=params))
+
+            data = frames[0]
+            if len(frames) > 1:
+                data = (pd.concat(frames, ignore_index=True)
+                        .drop_duplicates(['ticker', 'date'], keep='last')
+                        .sort_values(['ticker', 'date'], ignore_index=True))
+            return data
                 
         except Exception as e:
             logging.error(f"Error al obtener datos de stock: {e}")
@@ -116,6 +457,35 @@ class StockDatabase:
             logging.error(f"Error al obtener stocks almacenados: {e}")
             raise
 
+    def archive_file(self, year: int) -> str:
+        """Path of the archive database holding the bars of a given year."""
+        base, _ = os.path.splitext(self.db_file)
+        return f"{base}_archive_{year}.db"
+
+    def archive_files(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[str]:
+        """Existing archive databases, oldest year first, optionally only the years overlapping a date range."""
+        base, _ = os.path.splitext(self.db_file)
+        files = sorted(glob.glob(f"{glob.escape(base)}_archive_*.db"))
+        if start_date or end_date:
+            # El año está en el nombre del archivo: no hace falta abrirlo
+            files = [
+                f for f in files
+                if not (start_date and f[-7:-3] < start_date[:4]) and not (end_date and f[-7:-3] > end_date[:4])
+            ]
+        return files
+
+    def ticker_exists(self, ticker: str) -> bool:
+        """Check whether a ticker has stored data using the primary key index."""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM date_ranges WHERE ticker = ? LIMIT 1", (ticker,))
+                return cursor.fetchone() is not None
+                
+        except Exception as e:
+            logging.error(f"Error al verificar el ticker {ticker}: {e}")
+            raise
+
     def delete_stock_data(self, ticker: str):
         """Delete all data for a specific ticker."""
         try:
@@ -123,8 +493,22 @@ class StockDatabase:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM stock_data WHERE ticker = ?", (ticker,))
                 cursor.execute("DELETE FROM date_ranges WHERE ticker = ?", (ticker,))
+                cursor.execute("DELETE FROM adjustment_factors WHERE ticker = ?", (ticker,))
                 conn.commit()
                 
+                # Devolver al sistema las páginas liberadas
+                cursor.execute("PRAGMA incremental_vacuum").fetchall()
+
+            # Borrar también los años archivados del ticker
+            for archive in self.archive_files():
+                conn = sqlite3.connect(archive)
+                try:
+                    conn.execute("DELETE FROM stock_data WHERE ticker = ?", (ticker,))
+                    conn.commit()
+                finally:
+                    conn.close()
+                
         except Exception as e:
             logging.error(f"Error al eliminar datos: {e}")
-            raise
\ No newline at end of file
+            raise
+        self.notify_change(ticker)
@@ -0,0 +1,241 @@
+import sqlite3
+import logging
+import threading
+from typing import Callable, List, NamedTuple, Optional
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+    # VACUUM y algunos PRAGMA no pueden ejecutarse dentro de una transacción
+    transactional: bool = True
+
+
+def _rebuild_stock_data(conn: sqlite3.Connection):
+    """Rebuild stock_data as a clustered WITHOUT ROWID table keyed by (ticker, date)."""
+    conn.execute('''
+        CREATE TABLE stock_data_new (
+            ticker TEXT NOT NULL,
+            date TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume INTEGER,
+            PRIMARY KEY (ticker, date)
+        ) WITHOUT ROWID
+    ''')
+    # Versiones anteriores reemplazaban la tabla con to_sql, que no conserva la clave primaria
+    conn.execute('''
+        INSERT OR REPLACE INTO stock_data_new (ticker, date, open, high, low, close, volume)
+        SELECT ticker, date, open, high, low, close, volume
+        FROM stock_data
+        WHERE ticker IS NOT NULL AND date IS NOT NULL
+    ''')
+    conn.execute("DROP TABLE stock_data")
+    conn.execute("ALTER TABLE stock_data_new RENAME TO stock_data")
+    conn.execute("DELETE FROM date_ranges")
+    conn.execute('''
+        INSERT INTO date_ranges (ticker, start_date, end_date)
+        SELECT ticker, MIN(date), MAX(date) FROM stock_data GROUP BY ticker
+    ''')
+
+
+def _add_date_index(conn: sqlite3.Connection):
+    """Index for cross-ticker date range scans; it also covers (date, ticker) lookups."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_data_date ON stock_data (date, ticker)")
+
+
+def _enable_incremental_vacuum(conn: sqlite3.Connection):
+    """Switch the file to incremental auto-vacuum so deleted pages can be reclaimed in steps."""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # El cambio de auto_vacuum sólo tiene efecto después de un VACUUM completo
+    conn.execute("VACUUM")
+
+
+def _add_adjustment_factors(conn: sqlite3.Connection):
+    """Track whether each bar is raw and store corporate-action factors separately."""
+    # Las barras existentes se pidieron con el valor por defecto de la API (ajustadas)
+    conn.execute("ALTER TABLE stock_data ADD COLUMN adjusted INTEGER NOT NULL DEFAULT 1")
+    conn.execute("ALTER TABLE stock_data ADD COLUMN adjusted_as_of TEXT")
+    # La API ajusta al momento de la descarga, que es posterior a la última barra descargada
+    conn.execute('''
+        UPDATE stock_data
+        SET adjusted_as_of = (SELECT end_date FROM date_ranges WHERE date_ranges.ticker = stock_data.ticker)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS adjustment_factors (
+            ticker TEXT NOT NULL,
+            ex_date TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            price_factor REAL NOT NULL,
+            volume_factor REAL NOT NULL,
+            PRIMARY KEY (ticker, ex_date, kind)
+        ) WITHOUT ROWID
+    ''')
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "stock_data agrupada por (ticker, date)", _rebuild_stock_data),
+    Migration(2, "índice por fecha", _add_date_index),
+    Migration(3, "auto_vacuum incremental", _enable_incremental_vacuum, transactional=False),
+    Migration(4, "factores de ajuste por eventos corporativos", _add_adjustment_factors),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations in order and return the resulting schema version."""
+    version = get_schema_version(conn)
+    pending = [m for m in MIGRATIONS if m.version > version]
+    if not pending:
+        return version
+
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for migration in pending:
+            logging.info(f"Aplicando migración {migration.version}: {migration.description}")
+            if migration.transactional:
+                conn.execute("BEGIN")
+                try:
+                    migration.apply(conn)
+                    conn.execute(f"PRAGMA user_version = {migration.version}")
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            else:
+                migration.apply(conn)
+                conn.execute(f"PRAGMA user_version = {migration.version}")
+            version = migration.version
+
+        # Estadísticas actualizadas para el planificador de consultas
+        conn.execute("ANALYZE")
+    finally:
+        conn.isolation_level = isolation_level
+    return version
+
+
+class DatabaseMaintenance:
+    """Statistics, vacuuming and archiving tasks for a StockDatabase."""
+
+    def __init__(self, db_handler, free_page_ratio: float = 0.1):
+        self.db_handler = db_handler
+        self.free_page_ratio = free_page_ratio
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def analyze(self):
+        """Refresh query planner statistics where SQLite considers them stale."""
+        with self.db_handler.get_connection() as conn:
+            conn.execute("PRAGMA optimize")
+
+    def incremental_vacuum(self, pages: Optional[int] = None) -> int:
+        """Return free pages to the filesystem; all of them if pages is None."""
+        with self.db_handler.get_connection() as conn:
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if pages is None:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+            else:
+                conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            return free_before - free_after
+
+    def compact(self):
+        """Rebuild the whole file, defragmenting pages. Needs free disk space equal to the DB size."""
+        with self.db_handler.get_connection() as conn:
+            conn.isolation_level = None
+            conn.execute("VACUUM")
+            conn.execute("ANALYZE")
+
+    def run(self):
+        """Periodic maintenance: reclaim free pages past the threshold and refresh statistics."""
+        with self._lock:
+            try:
+                with self.db_handler.get_connection() as conn:
+                    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if page_count and free_pages / page_count >= self.free_page_ratio:
+                    freed = self.incremental_vacuum()
+                    logging.info(f"Vacuum incremental: {freed} páginas liberadas")
+                self.analyze()
+            except Exception as e:
+                logging.error(f"Error en el mantenimiento de la base de datos: {e}")
+
+    def start_scheduler(self, interval_seconds: float = 3600):
+        """Run maintenance in the background every interval_seconds."""
+        def tick():
+            self.run()
+            self.start_scheduler(interval_seconds)
+
+        self._timer = threading.Timer(interval_seconds, tick)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop_scheduler(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def archive_before(self, year: int) -> int:
+        """
+        Move all bars dated before the given year into one archive database per year.
+
+        Args:
+            year: First year that stays in the main database
+
+        Returns:
+            Number of rows moved
+        """
+        cutoff = f"{year:04d}-01-01"
+        moved = 0
+        with self.db_handler.get_connection() as conn:
+            years = [int(row[0]) for row in conn.execute(
+                "SELECT DISTINCT substr(date, 1, 4) FROM stock_data WHERE date < ?", (cutoff,)
+            )]
+
+            for archive_year in years:
+                start, end = f"{archive_year:04d}-01-01", f"{archive_year + 1:04d}-01-01"
+                conn.execute("ATTACH DATABASE ? AS archive", (self.db_handler.archive_file(archive_year),))
+                try:
+                    conn.execute('''
+                        CREATE TABLE IF NOT EXISTS archive.stock_data (
+                            ticker TEXT NOT NULL,
+                            date TEXT NOT NULL,
+                            open REAL,
+                            high REAL,
+                            low REAL,
+                            close REAL,
+                            volume INTEGER,
+                            adjusted INTEGER NOT NULL DEFAULT 1,
+                            adjusted_as_of TEXT,
+                            PRIMARY KEY (ticker, date)
+                        ) WITHOUT ROWID
+                    ''')
+                    conn.execute('''
+                        INSERT OR REPLACE INTO archive.stock_data
+                            (ticker, date, open, high, low, close, volume, adjusted, adjusted_as_of)
+                        SELECT ticker, date, open, high, low, close, volume, adjusted, adjusted_as_of
+                        FROM main.stock_data WHERE date >= ? AND date < ?
+                    ''', (start, end))
+                    cursor = conn.execute(
+                        "DELETE FROM main.stock_data WHERE date >= ? AND date < ?", (start, end)
+                    )
+                    moved += cursor.rowcount
+                    conn.commit()
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+
+            # date_ranges conserva el rango completo, incluidos los años archivados
+            tickers = [row[0] for row in conn.execute("SELECT ticker FROM date_ranges")]
+
+        logging.info(f"{moved} filas archivadas antes de {year}")
+        if moved:
+            for ticker in tickers:
+                self.db_handler.notify_change(ticker)
+            self.incremental_vacuum()
+        return moved
@@ -4,6 +4,7 @@ import tkinter as tk
 from tkinter import ttk
 import pandas as pd
 import logging
+from tracing import traced
 
 class StockGraph(ttk.Frame):
     def __init__(self, parent, ticker: str, data: pd.DataFrame):
@@ -13,6 +14,7 @@ class StockGraph(ttk.Frame):
         self.show_menu = None
         self.setup_graph()
 
+    @traced("StockGraph.setup_graph")
     def setup_graph(self):
         try:
             # Create figure
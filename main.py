@@ -4,8 +4,12 @@ import logging
 from api_handler import APIHandler
 from db_handler import StockDatabase
 from menu_components import MainMenu, DataUpdateForm, DataVisualization
+from data_cache import StockDataCache
+from db_maintenance import DatabaseMaintenance
 from login_window import LoginWindow
+from tracing import tracer
 from dotenv import load_dotenv
+import argparse
 import os
 
 # Setup logging
@@ -37,6 +41,11 @@ class StockApp:
             # Initialize components
             self.api_handler = APIHandler()
             self.db = StockDatabase()
+            self.cache = StockDataCache(self.db)
+            
+            # Mantenimiento periódico de la base de datos (vacuum incremental y estadísticas)
+            self.maintenance = DatabaseMaintenance(self.db)
+            self.maintenance.start_scheduler()
             
             # Setup main container
             self.main_container = ttk.Frame(root)
@@ -77,7 +86,7 @@ class StockApp:
 
     def show_data_viz(self):
         self.clear_container()
-        viz = DataVisualization(self.main_container, self.db)
+        viz = DataVisualization(self.main_container, self.db, self.username, self.cache)
         viz.show_menu = self.show_main_menu
         viz.pack(expand=True, fill='both')
 
@@ -88,12 +97,19 @@ class StockApp:
     def on_closing(self):
         # Manejar el cierre de la aplicación principal
         try:
+            if hasattr(self, 'maintenance'):
+                self.maintenance.stop_scheduler()
+            if hasattr(self, 'cache'):
+                # Detener la precarga en segundo plano
+                self.cache.close()
             if hasattr(self, 'db'):
                 # Cerrar conexiones de base de datos si existen
                 del self.db
             if hasattr(self, 'api_handler'):
                 # Limpiar recursos del API handler si es necesario
                 del self.api_handler
+            # os._exit no ejecuta atexit: guardar las trazas pendientes
+            tracer.flush()
             self.root.destroy()
             os._exit(0)
         except Exception as e:
@@ -101,6 +117,14 @@ class StockApp:
             os._exit(1)
 
 def main():
+    parser = argparse.ArgumentParser(description="Aplicación de Datos Financieros")
+    parser.add_argument('--trace', metavar='DIR', help="Guardar trazas de las operaciones principales en DIR")
+    parser.add_argument('--profile-ms', type=float, metavar='MS',
+                        help="Perfilar por muestreo las operaciones que tarden más de MS milisegundos")
+    args = parser.parse_args()
+    if args.trace:
+        tracer.configure(args.trace, args.profile_ms)
+
     try:
         login = LoginWindow()
         username = login.show()
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
 import pandas as pd
+import logging
+from tracing import traced
 
 class MainMenu(ttk.Frame):
     def __init__(self, parent):
@@ -66,6 +68,7 @@ class DataUpdateForm(ttk.Frame):
         self.status_label = ttk.Label(form_frame, text="")
         self.status_label.pack(pady=10)
 
+    @traced("save_to_database")
     def save_to_database(self):
         # Save stock data to database
         ticker = self.ticker_entry.get().strip().upper()
@@ -86,6 +89,7 @@ class DataUpdateForm(ttk.Frame):
             if data is not None:
                 # Save to database
                 self.db_handler.save_stock_data(ticker, data)
+                self.update_adjustments(ticker)
                 self.status_label.config(text="Datos guardados correctamente")
                 messagebox.showinfo("Éxito", "Datos guardados en la base de datos")
             else:
@@ -95,10 +99,20 @@ class DataUpdateForm(ttk.Frame):
             self.status_label.config(text="Error al guardar datos")
             messagebox.showerror("Error", str(e))
 
+    def update_adjustments(self, ticker):
+        # Guardar splits y dividendos como factores; las barras ya guardadas no se modifican
+        try:
+            actions = self.api_handler.get_corporate_actions(ticker)
+            self.db_handler.save_corporate_actions(ticker, actions)
+        except Exception as e:
+            logging.warning(f"No se pudieron actualizar los ajustes de {ticker}: {e}")
+
 class DataVisualization(ttk.Frame):
-    def __init__(self, parent, db_handler):
+    def __init__(self, parent, db_handler, username, cache):
         super().__init__(parent)
         self.db_handler = db_handler
+        self.username = username
+        self.cache = cache
         self.show_menu = None
         self.setup_visualization()
 
@@ -154,10 +168,7 @@ class DataVisualization(ttk.Frame):
 
         try:
             # Verificar si existen datos para este ticker
-            stored_stocks = self.db_handler.get_stored_stocks()
-            stored_tickers = [stock[0] for stock in stored_stocks]  # Obtener lista de tickers
-
-            if ticker not in stored_tickers:
+            if not self.db_handler.ticker_exists(ticker):
                 messagebox.showwarning("Error", f"No existen datos guardados para el ticker {ticker}")
                 return
 
@@ -177,7 +188,7 @@ class DataVisualization(ttk.Frame):
             
         ticker = ticker.strip().upper()
         try:
-            data = self.db_handler.get_stock_data(ticker)
+            data = self.cache.get_data(ticker)
             if data is not None and not data.empty:
                 from graph_visual import StockGraph
                 graph_window = tk.Toplevel(self)
@@ -188,13 +199,16 @@ class DataVisualization(ttk.Frame):
                 graph = StockGraph(graph_window, ticker, data)
                 graph.show_menu = self.show_menu  # Agregar esta línea
                 graph.pack(expand=True, fill='both')
+
+                # Precargar los tickers vecinos para que el siguiente gráfico sea inmediato
+                self.cache.prefetch_around(ticker)
             else:
                 messagebox.showwarning("Error", f"No existen datos disponibles para el ticker {ticker}")
         except Exception as e:
             messagebox.showerror("Error", f"Error al crear el gráfico: {str(e)}")
 
     def show_summary(self):
-        stored_stocks = self.db_handler.get_stored_stocks()
+        stored_stocks = self.cache.get_stored_stocks()
         
         self.results_text.delete(1.0, tk.END)
         self.results_text.insert(tk.END, "Los tickers guardados en la base de datos son:\n\n")
@@ -0,0 +1,368 @@
+import os
+import json
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+import pandas as pd
+from db_handler import StockDatabase
+from technical_analysis import TechnicalAnalysis
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow IPC es opcional
+    pa = None
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+JSON_MIME = 'application/json'
+MAX_HEADER_SIZE = 16 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ReadOnlyPool:
+    """Thread pool where every worker keeps its own read-only SQLite connection."""
+
+    def __init__(self, db_file: str, size: int = 4):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="db-read")
+
+    def connection(self, db_file: Optional[str] = None) -> sqlite3.Connection:
+        """Read-only connection of the current worker thread to db_file (the main database by default)."""
+        path = os.path.abspath(db_file or self.db_file)
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(path)
+        if conn is None:
+            conn = connections[path] = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        return conn
+
+    async def run(self, func, *args, archives: Tuple[str, ...] = ()):
+        """Run func(conn, *args) on a pooled connection, plus archives=[conn, ...] when archive files are given."""
+        loop = asyncio.get_running_loop()
+
+        def call():
+            if archives:
+                return func(self.connection(), *args, archives=[self.connection(f) for f in archives])
+            return func(self.connection(), *args)
+        return await loop.run_in_executor(self._executor, call)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def _query_stored(conn: sqlite3.Connection) -> pd.DataFrame:
+    return pd.read_sql_query(
+        "SELECT ticker, start_date, end_date FROM date_ranges ORDER BY ticker", conn
+    )
+
+
+def _query_bars(conn: sqlite3.Connection, ticker: str, start: Optional[str], end: Optional[str],
+                adjusted: bool = True, archives: Optional[List[sqlite3.Connection]] = None) -> pd.DataFrame:
+    query = "SELECT date, open, high, low, close, volume, adjusted, adjusted_as_of FROM stock_data WHERE ticker = ?"
+    params = [ticker]
+    if start:
+        query += " AND date >= ?"
+        params.append(start)
+    if end:
+        query += " AND date <= ?"
+        params.append(end)
+    query += " ORDER BY date"
+    frames = [pd.read_sql_query(query, archive, params=params) for archive in archives or []]
+    frames.append(pd.read_sql_query(query, conn, params=params))
+    bars = frames[0]
+    if len(frames) > 1:
+        # Igual que StockDatabase.get_stock_data: la base principal prevalece sobre los archivos
+        bars = (pd.concat(frames, ignore_index=True)
+                .drop_duplicates('date', keep='last')
+                .sort_values('date', ignore_index=True))
+    if adjusted:
+        factors = pd.read_sql_query(
+            "SELECT ex_date, kind, price_factor, volume_factor FROM adjustment_factors WHERE ticker = ? ORDER BY ex_date",
+            conn, params=(ticker,)
+        )
+        bars = StockDatabase.apply_adjustments(bars, factors)
+    return bars.drop(columns=['adjusted', 'adjusted_as_of'])
+
+
+def _indicator_frame(bars: pd.DataFrame) -> pd.DataFrame:
+    indicators = TechnicalAnalysis.calculate_indicators(bars)
+    return pd.DataFrame({
+        'date': bars['date'],
+        'rsi': indicators['RSI'],
+        'macd': indicators['MACD']['macd'],
+        'macd_signal': indicators['MACD']['signal'],
+        'macd_histogram': indicators['MACD']['histogram'],
+        'bb_upper': indicators['BB']['upper'],
+        'bb_middle': indicators['BB']['middle'],
+        'bb_lower': indicators['BB']['lower'],
+    })
+
+
+class StockServer:
+    """Headless HTTP API over StockDatabase and TechnicalAnalysis.
+
+    Endpoints:
+        GET  /stocks                                 stored tickers and date ranges
+        GET  /bars/<ticker>?start=&end=&adjusted=    daily bars, split/dividend adjusted unless adjusted=false
+        GET  /indicators/<ticker>?start=&end=        RSI, MACD and Bollinger series on adjusted bars
+        POST /ingest/<ticker>?start=&end=            fetch from the API and store
+    """
+
+    def __init__(self, db_file: str = 'stocks.db', pool_size: int = 4, cache_entries: int = 256):
+        # Crear/migrar el esquema antes de abrir conexiones de sólo lectura
+        self.db = StockDatabase(db_file)
+        self.pool = ReadOnlyPool(db_file, pool_size)
+        self.cache_entries = cache_entries
+        self._cache: "OrderedDict[Tuple, Tuple]" = OrderedDict()
+        # Indicadores sobre toda la historia por ticker; cada rango pedido es un recorte
+        self._indicator_cache: "OrderedDict[str, Tuple]" = OrderedDict()
+        # Cálculos y serialización fuera del event loop
+        self._compute = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="compute")
+        # Las escrituras se serializan en un único hilo
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self._api_handler = None
+        # Conexiones dedicadas a leer PRAGMA data_version desde el event loop
+        self._version_connections: Dict[str, sqlite3.Connection] = {}
+
+    def _data_version(self) -> Tuple:
+        """Token that changes whenever another connection commits to the database or an archive file."""
+        token = []
+        for path in [self.db.db_file] + self.db.archive_files():
+            conn = self._version_connections.get(path)
+            if conn is None:
+                conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+                self._version_connections[path] = conn
+            # PRAGMA data_version cambia con cada commit de otra conexión, incluso de otro proceso
+            token.append((path, conn.execute("PRAGMA data_version").fetchone()[0]))
+        return tuple(token)
+
+    @staticmethod
+    def _encode(frame: pd.DataFrame, fmt: str) -> Tuple[bytes, str]:
+        if fmt == ARROW_MIME:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            body = sink.getvalue().to_pybytes()
+        else:
+            body = frame.to_json(orient='split', index=False).encode()
+        return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+    async def _run_compute(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._compute, func, *args)
+
+    async def _frame_response(self, key: Tuple, fmt: str, build) -> Tuple[bytes, str]:
+        """Return (body, etag), reusing the cached body while the database is unchanged."""
+        version = self._data_version()
+        cache_key = key + (fmt,)
+        cached = self._cache.get(cache_key)
+        if cached and cached[0] == version:
+            self._cache.move_to_end(cache_key)
+            return cached[1], cached[2]
+
+        frame = await build()
+        body, etag = await self._run_compute(self._encode, frame, fmt)
+        self._cache[cache_key] = (version, body, etag)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+        return body, etag
+
+    async def _bars(self, ticker: str, start: Optional[str], end: Optional[str],
+                    adjusted: bool = True) -> pd.DataFrame:
+        archives = tuple(self.db.archive_files(start, end))
+        bars = await self.pool.run(_query_bars, ticker, start, end, adjusted, archives=archives)
+        if bars.empty:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No existen datos para el ticker {ticker}")
+        return bars
+
+    async def _indicators(self, ticker: str, start: Optional[str], end: Optional[str]) -> pd.DataFrame:
+        # Los indicadores se calculan una vez sobre toda la serie y luego se recortan al rango pedido
+        version = self._data_version()
+        cached = self._indicator_cache.get(ticker)
+        if cached and cached[0] == version:
+            self._indicator_cache.move_to_end(ticker)
+            frame = cached[1]
+        else:
+            frame = await self._run_compute(_indicator_frame, await self._bars(ticker, None, None))
+            self._indicator_cache[ticker] = (version, frame)
+            while len(self._indicator_cache) > self.cache_entries:
+                self._indicator_cache.popitem(last=False)
+
+        if start:
+            frame = frame[frame['date'] >= start]
+        if end:
+            frame = frame[frame['date'] <= end]
+        return frame
+
+    def _ingest(self, ticker: str, start: Optional[str], end: Optional[str]) -> Dict:
+        if self._api_handler is None:
+            from api_handler import APIHandler
+            self._api_handler = APIHandler()
+        data = self._api_handler.get_stock_data(ticker, start, end)
+        if data is None:
+            return {'ticker': ticker, 'rows': 0}
+        self.db.save_stock_data(ticker, data)
+        try:
+            self.db.save_corporate_actions(ticker, self._api_handler.get_corporate_actions(ticker))
+        except Exception as e:
+            logging.warning(f"No se pudieron actualizar los ajustes de {ticker}: {e}")
+        return {'ticker': ticker, 'rows': len(data)}
+
+    async def handle(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[HTTPStatus, Dict[str, str], bytes]:
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        start = query.get('start', '').replace('/', '-') or None
+        end = query.get('end', '').replace('/', '-') or None
+
+        accept = headers.get('accept', '')
+        fmt = ARROW_MIME if ARROW_MIME in accept else JSON_MIME
+        if fmt == ARROW_MIME and pa is None:
+            raise HTTPError(HTTPStatus.NOT_ACCEPTABLE, "Arrow IPC requiere pyarrow")
+
+        if method == 'POST' and len(parts) == 2 and parts[0] == 'ingest':
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self._writer, self._ingest, parts[1].upper(), start, end)
+            except ValueError as e:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+            except Exception as e:
+                raise HTTPError(HTTPStatus.BAD_GATEWAY, str(e))
+            return HTTPStatus.OK, {'Content-Type': JSON_MIME}, json.dumps(result, separators=(',', ':')).encode()
+
+        if method not in ('GET', 'HEAD'):
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Método no soportado: {method}")
+
+        if parts == ['stocks']:
+            body, etag = await self._frame_response(('stocks',), fmt, lambda: self.pool.run(_query_stored))
+        elif len(parts) == 2 and parts[0] == 'bars':
+            ticker = parts[1].upper()
+            adjusted = query.get('adjusted', 'true').lower() not in ('false', '0')
+            body, etag = await self._frame_response(('bars', ticker, start, end, adjusted), fmt,
+                                                    lambda: self._bars(ticker, start, end, adjusted))
+        elif len(parts) == 2 and parts[0] == 'indicators':
+            ticker = parts[1].upper()
+            body, etag = await self._frame_response(('indicators', ticker, start, end), fmt,
+                                                    lambda: self._indicators(ticker, start, end))
+        else:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Ruta no encontrada: {url.path}")
+
+        response_headers = {'Content-Type': fmt, 'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return HTTPStatus.NOT_MODIFIED, response_headers, b''
+        return HTTPStatus.OK, response_headers, body
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._write(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, {}, b'', False)
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self._write(writer, HTTPStatus.BAD_REQUEST, {}, b'', False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._write(writer, HTTPStatus.BAD_REQUEST, {}, b'', False)
+                    break
+                if length:
+                    await reader.readexactly(length)
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+
+                try:
+                    status, response_headers, body = await self.handle(method.upper(), target, headers)
+                except HTTPError as e:
+                    status, response_headers = e.status, {'Content-Type': JSON_MIME}
+                    body = json.dumps({'error': e.message}, separators=(',', ':')).encode()
+                except Exception as e:
+                    logging.error(f"Error al procesar {method} {target}: {e}")
+                    status, response_headers = HTTPStatus.INTERNAL_SERVER_ERROR, {'Content-Type': JSON_MIME}
+                    body = json.dumps({'error': 'Error interno'}, separators=(',', ':')).encode()
+
+                if method.upper() == 'HEAD':
+                    response_headers['Content-Length'] = str(len(body))
+                    body = b''
+                await self._write(writer, status, response_headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _write(writer: asyncio.StreamWriter, status: HTTPStatus, headers: Dict[str, str],
+                     body: bytes, keep_alive: bool):
+        headers.setdefault('Content-Length', str(len(body)))
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8000):
+        server = await asyncio.start_server(self._serve_connection, host, port, limit=MAX_HEADER_SIZE)
+        logging.info(f"Servidor escuchando en http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.close()
+        self._compute.shutdown(wait=False)
+        self._writer.shutdown(wait=False)
+        for conn in self._version_connections.values():
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP local para los datos de acciones")
+    parser.add_argument('--db', default='stocks.db', help="Archivo de base de datos")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pool-size', type=int, default=4, help="Conexiones de lectura")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = StockServer(args.db, args.pool_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from db_handler import StockDatabase
+
+MANIFEST_FILE = 'manifest.json'
+SNAPSHOT_FORMAT = 1
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SnapshotManager:
+    """Export and import stocks.db bars as compressed columnar snapshot files."""
+
+    def __init__(self, db_handler: StockDatabase):
+        self.db_handler = db_handler
+
+    def export(self, directory: str, tickers: Optional[List[str]] = None, start_date: Optional[str] = None,
+               end_date: Optional[str] = None, tickers_per_file: int = 100) -> Dict:
+        """
+        Write the selected bars into a snapshot directory.
+
+        Args:
+            directory: Output directory, created if needed
+            tickers: Stock symbols to export (all stored tickers if omitted)
+            start_date: First date to export in YYYY-MM-DD format (optional)
+            end_date: Last date to export in YYYY-MM-DD format (optional)
+            tickers_per_file: Number of tickers grouped into each snapshot file
+
+        Returns:
+            The snapshot manifest
+        """
+        os.makedirs(directory, exist_ok=True)
+        if not tickers:
+            tickers = [stock[0] for stock in self.db_handler.get_stored_stocks()]
+
+        files = []
+        for index in range(0, len(tickers), tickers_per_file):
+            group = tickers[index:index + tickers_per_file]
+            data = self.db_handler.get_bars(group, start_date, end_date, include_archive=True)
+            if data.empty:
+                continue
+            factors = self.db_handler.get_adjustments(group)
+
+            name = f"part-{len(files):05d}.npz"
+            path = os.path.join(directory, name)
+            self._write_file(path, data, factors)
+            files.append({
+                'name': name,
+                'rows': len(data),
+                'tickers': sorted(data['ticker'].unique().tolist()),
+                'sha256': _sha256(path),
+            })
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'start_date': start_date,
+            'end_date': end_date,
+            'files': files,
+        }
+        with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        logging.info(f"Snapshot exportado en {directory}: {sum(f['rows'] for f in files)} filas")
+        return manifest
+
+    @staticmethod
+    def _write_file(path: str, data: pd.DataFrame, factors: pd.DataFrame):
+        # Columnas: tickers como códigos de diccionario, fechas como días desde epoch
+        codes, symbols = pd.factorize(data['ticker'])
+        dates = pd.to_datetime(data['date']).to_numpy().astype('datetime64[D]').astype(np.int32)
+        columns = {
+            'symbols': np.asarray(symbols, dtype=str),
+            'ticker': codes.astype(np.int32),
+            'date': dates,
+            'adjusted': data['adjusted'].to_numpy(dtype=np.int8),
+            # Cadena vacía para las barras sin ajustar
+            'adjusted_as_of': data['adjusted_as_of'].fillna('').to_numpy(dtype=str),
+        }
+        for column in PRICE_COLUMNS:
+            columns[column] = data[column].to_numpy(dtype=np.float64)
+
+        # Factores de ajuste de los mismos tickers, con prefijo factor_
+        columns['factor_ticker'] = factors['ticker'].to_numpy(dtype=str)
+        columns['factor_ex_date'] = factors['ex_date'].to_numpy(dtype=str)
+        columns['factor_kind'] = factors['kind'].to_numpy(dtype=str)
+        columns['factor_price'] = factors['price_factor'].to_numpy(dtype=np.float64)
+        columns['factor_volume'] = factors['volume_factor'].to_numpy(dtype=np.float64)
+        np.savez_compressed(path, **columns)
+
+    @staticmethod
+    def _read_file(path: str, checksum: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        if _sha256(path) != checksum:
+            raise ValueError(f"Checksum inválido para {path}")
+
+        with np.load(path, allow_pickle=False) as columns:
+            data = pd.DataFrame({
+                'ticker': columns['symbols'][columns['ticker']],
+                'date': np.datetime_as_string(columns['date'].astype('datetime64[D]')),
+            })
+            for column in PRICE_COLUMNS:
+                data[column] = columns[column]
+            data['adjusted'] = columns['adjusted']
+            data['adjusted_as_of'] = pd.Series(columns['adjusted_as_of']).replace('', None)
+
+            factors = pd.DataFrame({
+                'ticker': columns['factor_ticker'],
+                'ex_date': columns['factor_ex_date'],
+                'kind': columns['factor_kind'],
+                'price_factor': columns['factor_price'],
+                'volume_factor': columns['factor_volume'],
+            })
+        return data, factors
+
+    def import_(self, directory: str, max_workers: Optional[int] = None) -> int:
+        """
+        Load a snapshot directory into the database, skipping rows that already exist.
+
+        Files are read, verified and decoded in parallel; rows are written through
+        StockDatabase.bulk_insert, and adjustment factors through save_adjustments,
+        as each file becomes available.
+
+        Args:
+            directory: Snapshot directory containing manifest.json
+            max_workers: Number of reader threads
+
+        Returns:
+            Number of new rows written
+        """
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Formato de snapshot no soportado: {manifest.get('format')}")
+
+        written = 0
+        # SQLite admite un único escritor: la lectura y descompresión van en paralelo
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self._read_file, os.path.join(directory, entry['name']), entry['sha256']): entry
+                for entry in manifest['files']
+            }
+            for future in as_completed(futures):
+                entry = futures[future]
+                data, factors = future.result()
+                written += self.db_handler.bulk_insert(data, skip_existing=True)
+                self.db_handler.save_adjustments(factors)
+                logging.info(f"Snapshot {entry['name']} importado ({len(data)} filas)")
+
+        logging.info(f"Snapshot importado desde {directory}: {written} filas nuevas")
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar/importar snapshots de stocks.db")
+    parser.add_argument('--db', default='stocks.db', help="Archivo de base de datos")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Exportar datos a un snapshot")
+    export_parser.add_argument('directory')
+    export_parser.add_argument('--tickers', nargs='*')
+    export_parser.add_argument('--start', help="Fecha inicio (YYYY-MM-DD)")
+    export_parser.add_argument('--end', help="Fecha fin (YYYY-MM-DD)")
+    export_parser.add_argument('--tickers-per-file', type=int, default=100)
+
+    import_parser = subparsers.add_parser('import', help="Importar un snapshot")
+    import_parser.add_argument('directory')
+    import_parser.add_argument('--workers', type=int)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    manager = SnapshotManager(StockDatabase(args.db))
+    if args.command == 'export':
+        tickers = [t.upper() for t in args.tickers] if args.tickers else None
+        manager.export(args.directory, tickers, args.start, args.end, args.tickers_per_file)
+    else:
+        manager.import_(args.directory, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 import pandas as pd
 import numpy as np
 from typing import Dict
+from tracing import traced
 
 class TechnicalAnalysis:
     @staticmethod
+    @traced("calculate_indicators")
     def calculate_indicators(data: pd.DataFrame) -> Dict[str, pd.Series]:
         """Calculate technical indicators for the given data."""
         indicators = {}
@@ -31,12 +33,12 @@ class TechnicalAnalysis:
         return rsi
 
     @staticmethod
-    def calculate_macd(prices: pd.Series) -> Dict[str, pd.Series]:
+    def calculate_macd(prices: pd.Series, fast: int = 12, slow: int = 26, signal_period: int = 9) -> Dict[str, pd.Series]:
         """Calculate MACD indicator."""
-        exp1 = prices.ewm(span=12, adjust=False).mean()
-        exp2 = prices.ewm(span=26, adjust=False).mean()
+        exp1 = prices.ewm(span=fast, adjust=False).mean()
+        exp2 = prices.ewm(span=slow, adjust=False).mean()
         macd = exp1 - exp2
-        signal = macd.ewm(span=9, adjust=False).mean()
+        signal = macd.ewm(span=signal_period, adjust=False).mean()
         
         return {
             'macd': macd,
@@ -45,13 +47,13 @@ class TechnicalAnalysis:
         }
 
     @staticmethod
-    def calculate_bollinger_bands(prices: pd.Series, period: int = 20) -> Dict[str, pd.Series]:
+    def calculate_bollinger_bands(prices: pd.Series, period: int = 20, num_std: float = 2) -> Dict[str, pd.Series]:
         """Calculate Bollinger Bands."""
         sma = prices.rolling(window=period).mean()
         std = prices.rolling(window=period).std()
         
         return {
-            'upper': sma + (std * 2),
+            'upper': sma + (std * num_std),
             'middle': sma,
-            'lower': sma - (std * 2)
+            'lower': sma - (std * num_std)
         }
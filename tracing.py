@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import atexit
+import inspect
+import logging
+import itertools
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+# Variables de entorno para activar el modo de perfilado sin tocar el código
+TRACE_ENV = 'STOCK_APP_TRACE'
+PROFILE_ENV = 'STOCK_APP_PROFILE_MS'
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+_sampling: contextvars.ContextVar = contextvars.ContextVar('sampling', default=False)
+
+
+class _StackSampler(threading.Thread):
+    """Periodically sample the stack of one thread and count collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True, name="trace-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+class Tracer:
+    """Collect trace spans in Chrome Trace Event format and optional per-span flame graphs."""
+
+    def __init__(self, max_events: int = 10000):
+        self.enabled = False
+        # Los spans se vuelcan a un nuevo archivo al llegar a este número
+        self.max_events = max_events
+        self.output_dir: Optional[str] = None
+        self.profile_threshold_ms: Optional[float] = None
+        self.sample_interval = 0.005
+        self._events: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._files = itertools.count(1)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def configure(self, output_dir: str, profile_threshold_ms: Optional[float] = None,
+                  sample_interval: float = 0.005):
+        """
+        Enable tracing.
+
+        Args:
+            output_dir: Directory for trace (.json) and flame graph (.folded) files
+            profile_threshold_ms: Sample-profile spans and keep those slower than this (optional)
+            sample_interval: Seconds between stack samples while profiling
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.profile_threshold_ms = profile_threshold_ms
+        self.sample_interval = sample_interval
+        self.enabled = True
+        logging.info(f"Trazas activadas en {output_dir}")
+
+    def configure_from_env(self):
+        output_dir = os.getenv(TRACE_ENV)
+        if output_dir:
+            threshold = os.getenv(PROFILE_ENV)
+            try:
+                threshold_ms = float(threshold) if threshold else None
+            except ValueError:
+                logging.warning(f"Valor inválido en {PROFILE_ENV}: {threshold!r}; perfilado desactivado")
+                threshold_ms = None
+            self.configure(output_dir, threshold_ms)
+
+    @contextmanager
+    def span(self, name: str, **args):
+        """Record a timed span nested under the current one."""
+        if not self.enabled:
+            yield
+            return
+
+        span_id = next(self._ids)
+        parent_id = _current_span.get()
+        token = _current_span.set(span_id)
+
+        # Sólo el span más externo de cada hilo toma muestras
+        sampler = None
+        sampling_token = None
+        if self.profile_threshold_ms is not None and not _sampling.get():
+            sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+            sampling_token = _sampling.set(True)
+
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            _current_span.reset(token)
+            if sampler is not None:
+                _sampling.reset(sampling_token)
+                stacks = sampler.stop()
+                if stacks and duration * 1000 >= self.profile_threshold_ms:
+                    self._write_flame_graph(name, span_id, stacks)
+
+            event_args = {'span_id': span_id, 'parent_id': parent_id, **args}
+            if error:
+                event_args['error'] = error
+            event = {
+                'name': name,
+                'cat': 'stock_app',
+                'ph': 'X',
+                'ts': (start - self._origin) * 1e6,
+                'dur': duration * 1e6,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': event_args,
+            }
+            with self._lock:
+                self._events.append(event)
+                full = len(self._events) >= self.max_events
+            if full:
+                self.flush()
+
+    def _write_flame_graph(self, name: str, span_id: int, stacks: Counter):
+        # Formato "collapsed stacks", compatible con flamegraph.pl y speedscope
+        path = os.path.join(self.output_dir, f"{name}-{os.getpid()}-{span_id}.folded")
+        try:
+            with open(path, 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            logging.info(f"Perfil de {name} guardado en {path}")
+        except OSError as e:
+            logging.error(f"Error al guardar el perfil de {name}: {e}")
+
+    def flush(self) -> Optional[str]:
+        """Write the collected spans to a trace file viewable in chrome://tracing or Perfetto."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return None
+
+        path = os.path.join(self.output_dir, f"trace-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{next(self._files)}.json")
+        try:
+            with open(path, 'w') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+            logging.info(f"Traza guardada en {path}")
+            return path
+        except OSError as e:
+            logging.error(f"Error al guardar la traza: {e}")
+            return None
+
+
+tracer = Tracer()
+tracer.configure_from_env()
+atexit.register(tracer.flush)
+
+
+def traced(name: str):
+    """Decorator wrapping a function in a trace span; records the ticker argument if present."""
+    def decorator(func):
+        parameters = list(inspect.signature(func).parameters)
+        ticker_index = parameters.index('ticker') if 'ticker' in parameters else None
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+
+            span_args = {}
+            if 'ticker' in kwargs:
+                span_args['ticker'] = kwargs['ticker']
+            elif ticker_index is not None and ticker_index < len(args):
+                span_args['ticker'] = args[ticker_index]
+            with tracer.span(name, **span_args):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator